@@ -2,6 +2,8 @@ from transformers import AutoModelForQuestionAnswering, AutoTokenizer
 import streamlit as st
 from random import randint
 import multiprocessing
+import json
+import uuid
 
 from haystack.nodes import FARMReader, TransformersReader
 # In-Memory Document Store
@@ -13,17 +15,34 @@ import os
 from haystack.utils import clean_wiki_text, convert_files_to_docs, print_answers
 import tempfile
 import PyPDF2
+import torch
+
+from backends import artifact_path, load_reader
+from ingest import ContractIndex
+from instrumentation import Timings
+from pdf_extract import answer_page
+import questions as questions_module
+from retrieval import clause_retrieval_key
+from review import READER_TOP_K, order_by_cost, run_review
+from result_cache import ResultCache, hash_bytes, hash_directory
+
+# Reader batching: question/passage pairs from every selected clause type are
+# packed into batches of this size and run with a pinned number of CPU threads.
+READER_BATCH_SIZE = int(os.environ.get("READER_BATCH_SIZE", 64))
+NUM_THREADS = int(os.environ.get("NUM_THREADS", multiprocessing.cpu_count()))
+torch.set_num_threads(NUM_THREADS)
+# clause questions sent to the reader per batch while streaming results to the UI; smaller
+# chunks show the first answers sooner, larger ones keep reader batches fuller
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 4))
+# one of backends.BACKENDS: fp32, int8, onnx, onnx-int8
+READER_BACKEND = os.environ.get("READER_BACKEND", "fp32")
+CACHE_MAX_MB = int(os.environ.get("CACHE_MAX_MB", 512))
 
 st.set_page_config(layout="wide")
 # fd = tempfile.TemporaryDirectory()
 # st.write(fd.name)
-if os.path.isdir('contracts'):
-    pass
-else:
-    os.mkdir("contracts")
-document_store = InMemoryDocumentStore()
 
-st.write("CPU:", multiprocessing.cpu_count())
+st.write("CPU:", multiprocessing.cpu_count(), "threads:", NUM_THREADS, "batch size:", READER_BATCH_SIZE, "backend:", READER_BACKEND)
 with st.sidebar:
     st.image("logo_black-orange.png", width=200)
 
@@ -41,108 +60,107 @@ st.markdown(f'''
 
 @st.cache(allow_output_mutation=True)
 def load_model():
-    reader = FARMReader(model_name_or_path="CoreCLM-CR", use_gpu=False)
+    reader = load_reader("CoreCLM-CR", READER_BACKEND, batch_size=READER_BATCH_SIZE, num_threads=NUM_THREADS)
     #reader = TransformersReader(model_name_or_path="marshmellow77/roberta-base-cuad", tokenizer="marshmellow77/roberta-base-cuad", use_gpu=False)
     return reader
 
 
+@st.cache(allow_output_mutation=True)
+def load_result_cache():
+    return ResultCache("review_cache", max_bytes=CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache(allow_output_mutation=True)
+def load_contract_index():
+    # shared across reruns and sessions; each contract keeps its own BM25 index, and its files are
+    # removed once no session holds it any more
+    return ContractIndex("contracts", preprocessor=preprocessor)
+
+
+@st.cache
+def get_model_hash():
+    # quantized backends give slightly different answers, so they never share cache entries
+    return hash_bytes((hash_directory(artifact_path("CoreCLM-CR", READER_BACKEND)) + READER_BACKEND).encode("utf-8"))
+
+
 @st.cache(allow_output_mutation=True)
 def load_questions():
-    entities = ["Document Name", "Parties", "Agreement Date", "Effective Date", "Expiration Date", "Renewal Term",
-                "Notice Period To Terminate Renewal", "Governing Law", "Most Favored Nation", "Non-Compete",
-                "Exclusivity", "No-Solicit Of Customers", "Competitive Restriction Exception",
-                "No-Solicit Of Employees", "Non-Disparagement", "Termination For Convenience", "Rofr/Rofo/Rofn",
-                "Change Of Control", "Anti-Assignment", "Revenue/Profit Sharing", "Price Restrictions",
-                "Minimum Commitment", "Volume Restriction", "Ip Ownership Assignment", "Joint Ip Ownership",
-                "License Grant", "Non-Transferable License", "Affiliate License-Licensor", "Affiliate License-Licensee",
-                "Unlimited/All-You-Can-Eat-License", "Irrevocable Or Perpetual License", "Source Code Escrow",
-                "Post-Termination Services", "Audit Rights", "Uncapped Liability", "Cap On Liability",
-                "Liquidated Damages", "Warranty Duration", "Insurance", "Covenant Not To Sue",
-                "Third Party Beneficiary"]
-    # entities.sort()
-    questions = [
-        'Highlight the parts (if any) of this contract related to "Document Name" that should be reviewed by a lawyer. Details: The name of the contract',
-        'Highlight the parts (if any) of this contract related to "Parties" that should be reviewed by a lawyer. Details: The two or more parties who signed the contract',
-        'Highlight the parts (if any) of this contract related to "Agreement Date" that should be reviewed by a lawyer. Details: The date of the contract',
-        'Highlight the parts (if any) of this contract related to "Effective Date" that should be reviewed by a lawyer. Details: The date when the contract is effective ',
-        'Highlight the parts (if any) of this contract related to "Expiration Date" that should be reviewed by a lawyer. Details: On what date will the contracts initial term expire?',
-        'Highlight the parts (if any) of this contract related to "Renewal Term" that should be reviewed by a lawyer. Details: What is the renewal term after the initial term expires? This includes automatic extensions and unilateral extensions with prior notice.',
-        'Highlight the parts (if any) of this contract related to "Notice Period To Terminate Renewal" that should be reviewed by a lawyer. Details: What is the notice period required to terminate renewal?',
-        'Highlight the parts (if any) of this contract related to "Governing Law" that should be reviewed by a lawyer. Details: Which state/countrys law governs the interpretation of the contract?',
-        'Highlight the parts (if any) of this contract related to "Most Favored Nation" that should be reviewed by a lawyer. Details: Is there a clause that if a third party gets better terms on the licensing or sale of technology/goods/services described in the contract, the buyer of such technology/goods/services under the contract shall be entitled to those better terms?',
-        'Highlight the parts (if any) of this contract related to "Non-Compete" that should be reviewed by a lawyer. Details: Is there a restriction on the ability of a party to compete with the counterparty or operate in a certain geography or business or technology sector? ',
-        'Highlight the parts (if any) of this contract related to "Exclusivity" that should be reviewed by a lawyer. Details: Is there an exclusive dealing  commitment with the counterparty? This includes a commitment to procure all “requirements” from one party of certain technology, goods, or services or a prohibition on licensing or selling technology, goods or services to third parties, or a prohibition on  collaborating or working with other parties), whether during the contract or  after the contract ends (or both).',
-        'Highlight the parts (if any) of this contract related to "No-Solicit Of Customers" that should be reviewed by a lawyer. Details: Is a party restricted from contracting or soliciting customers or partners of the counterparty, whether during the contract or after the contract ends (or both)?',
-        'Highlight the parts (if any) of this contract related to "Competitive Restriction Exception" that should be reviewed by a lawyer. Details: This category includes the exceptions or carveouts to Non-Compete, Exclusivity and No-Solicit of Customers above.',
-        'Highlight the parts (if any) of this contract related to "No-Solicit Of Employees" that should be reviewed by a lawyer. Details: Is there a restriction on a party’s soliciting or hiring employees and/or contractors from the  counterparty, whether during the contract or after the contract ends (or both)?',
-        'Highlight the parts (if any) of this contract related to "Non-Disparagement" that should be reviewed by a lawyer. Details: Is there a requirement on a party not to disparage the counterparty?',
-        'Highlight the parts (if any) of this contract related to "Termination For Convenience" that should be reviewed by a lawyer. Details: Can a party terminate this  contract without cause (solely by giving a notice and allowing a waiting  period to expire)?',
-        'Highlight the parts (if any) of this contract related to "Rofr/Rofo/Rofn" that should be reviewed by a lawyer. Details: Is there a clause granting one party a right of first refusal, right of first offer or right of first negotiation to purchase, license, market, or distribute equity interest, technology, assets, products or services?',
-        'Highlight the parts (if any) of this contract related to "Change Of Control" that should be reviewed by a lawyer. Details: Does one party have the right to terminate or is consent or notice required of the counterparty if such party undergoes a change of control, such as a merger, stock sale, transfer of all or substantially all of its assets or business, or assignment by operation of law?',
-        'Highlight the parts (if any) of this contract related to "Anti-Assignment" that should be reviewed by a lawyer. Details: Is consent or notice required of a party if the contract is assigned to a third party?',
-        'Highlight the parts (if any) of this contract related to "Revenue/Profit Sharing" that should be reviewed by a lawyer. Details: Is one party required to share revenue or profit with the counterparty for any technology, goods, or services?',
-        'Highlight the parts (if any) of this contract related to "Price Restrictions" that should be reviewed by a lawyer. Details: Is there a restriction on the  ability of a party to raise or reduce prices of technology, goods, or  services provided?',
-        'Highlight the parts (if any) of this contract related to "Minimum Commitment" that should be reviewed by a lawyer. Details: Is there a minimum order size or minimum amount or units per-time period that one party must buy from the counterparty under the contract?',
-        'Highlight the parts (if any) of this contract related to "Volume Restriction" that should be reviewed by a lawyer. Details: Is there a fee increase or consent requirement, etc. if one party’s use of the product/services exceeds certain threshold?',
-        'Highlight the parts (if any) of this contract related to "Ip Ownership Assignment" that should be reviewed by a lawyer. Details: Does intellectual property created  by one party become the property of the counterparty, either per the terms of the contract or upon the occurrence of certain events?',
-        'Highlight the parts (if any) of this contract related to "Joint Ip Ownership" that should be reviewed by a lawyer. Details: Is there any clause providing for joint or shared ownership of intellectual property between the parties to the contract?',
-        'Highlight the parts (if any) of this contract related to "License Grant" that should be reviewed by a lawyer. Details: Does the contract contain a license granted by one party to its counterparty?',
-        'Highlight the parts (if any) of this contract related to "Non-Transferable License" that should be reviewed by a lawyer. Details: Does the contract limit the ability of a party to transfer the license being granted to a third party?',
-        'Highlight the parts (if any) of this contract related to "Affiliate License-Licensor" that should be reviewed by a lawyer. Details: Does the contract contain a license grant by affiliates of the licensor or that includes intellectual property of affiliates of the licensor? ',
-        'Highlight the parts (if any) of this contract related to "Affiliate License-Licensee" that should be reviewed by a lawyer. Details: Does the contract contain a license grant to a licensee (incl. sublicensor) and the affiliates of such licensee/sublicensor?',
-        'Highlight the parts (if any) of this contract related to "Unlimited/All-You-Can-Eat-License" that should be reviewed by a lawyer. Details: Is there a clause granting one party an “enterprise,” “all you can eat” or unlimited usage license?',
-        'Highlight the parts (if any) of this contract related to "Irrevocable Or Perpetual License" that should be reviewed by a lawyer. Details: Does the contract contain a  license grant that is irrevocable or perpetual?',
-        'Highlight the parts (if any) of this contract related to "Source Code Escrow" that should be reviewed by a lawyer. Details: Is one party required to deposit its source code into escrow with a third party, which can be released to the counterparty upon the occurrence of certain events (bankruptcy,  insolvency, etc.)?',
-        'Highlight the parts (if any) of this contract related to "Post-Termination Services" that should be reviewed by a lawyer. Details: Is a party subject to obligations after the termination or expiration of a contract, including any post-termination transition, payment, transfer of IP, wind-down, last-buy, or similar commitments?',
-        'Highlight the parts (if any) of this contract related to "Audit Rights" that should be reviewed by a lawyer. Details: Does a party have the right to  audit the books, records, or physical locations of the counterparty to ensure compliance with the contract?',
-        'Highlight the parts (if any) of this contract related to "Uncapped Liability" that should be reviewed by a lawyer. Details: Is a party’s liability uncapped upon the breach of its obligation in the contract? This also includes uncap liability for a particular type of breach such as IP infringement or breach of confidentiality obligation.',
-        'Highlight the parts (if any) of this contract related to "Cap On Liability" that should be reviewed by a lawyer. Details: Does the contract include a cap on liability upon the breach of a party’s obligation? This includes time limitation for the counterparty to bring claims or maximum amount for recovery.',
-        'Highlight the parts (if any) of this contract related to "Liquidated Damages" that should be reviewed by a lawyer. Details: Does the contract contain a clause that would award either party liquidated damages for breach or a fee upon the termination of a contract (termination fee)?',
-        'Highlight the parts (if any) of this contract related to "Warranty Duration" that should be reviewed by a lawyer. Details: What is the duration of any  warranty against defects or errors in technology, products, or services  provided under the contract?',
-        'Highlight the parts (if any) of this contract related to "Insurance" that should be reviewed by a lawyer. Details: Is there a requirement for insurance that must be maintained by one party for the benefit of the counterparty?',
-        'Highlight the parts (if any) of this contract related to "Covenant Not To Sue" that should be reviewed by a lawyer. Details: Is a party restricted from contesting the validity of the counterparty’s ownership of intellectual property or otherwise bringing a claim against the counterparty for matters unrelated to the contract?',
-        'Highlight the parts (if any) of this contract related to "Third Party Beneficiary" that should be reviewed by a lawyer. Details: Is there a non-contracting party who is a beneficiary to some or all of the clauses in the contract and therefore can enforce its rights against a contracting party?'
-        ]
-    questions = [x for _, x in sorted(zip(entities, questions))]
-    return questions
+    return questions_module.load_questions()
 
 
 if 'key' not in st.session_state:
     st.session_state.key = str(randint(1000, 100000000))
+# identifies this browser session as a holder of its contract in the shared contract index; unlike
+# key it survives Reset
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
 
 
 def clear_multi():
     st.session_state.multiselect = []
     return
 
+# PDF pages are streamed through this one page at a time, so header/footer detection (which needs
+# the whole document) is off; splitting by passage keeps the paragraph-sized documents
 preprocessor = PreProcessor(
     clean_empty_lines=True,
     clean_whitespace=True,
-    clean_header_footer=True,
+    clean_header_footer=False,
+    split_by="passage",
+    split_length=1,
+    split_respect_sentence_boundary=False,
 )
 
 reader = load_model()
 questions = load_questions()
 
-@st.cache(allow_output_mutation=True)
-def get_docs():
-    all_docs = convert_files_to_docs(dir_path="contracts", split_paragraphs=True)
-    return all_docs
-
-@st.cache(allow_output_mutation=True)
-def get_retriever():
-    retriever = TfidfRetriever(document_store=document_store)
-    return retriever
-
+def stream_cached_review(question_set, contract_hash, index, chunk_size=STREAM_CHUNK_SIZE, timings=None):
+    # yields (question, answers) as soon as each is ready: answers already computed for this
+    # (contract, model, question, top_k) come first, then the clause types not seen before are
+    # sent to the reader chunk_size questions at a time. Closing the generator cancels the
+    # chunks not started yet.
+    timings = timings or Timings()
+    result_cache = load_result_cache()
+    model_hash = get_model_hash()
+    keys = [
+        ResultCache.make_key(contract_hash, model_hash, q, clause_retrieval_key(q), READER_TOP_K)
+        for q in question_set
+    ]
+    with timings.stage("cache_lookup"):
+        answers = result_cache.get_many(keys)
+    missing = [(q, k) for q, k in zip(question_set, keys) if k not in answers]
+    for q, k in zip(question_set, keys):
+        if k in answers:
+            yield q, answers[k]
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i + chunk_size]
+        computed = run_review(reader, index, [q for q, _ in chunk], batch_size=READER_BATCH_SIZE, timings=timings)
+        for (q, key), each in zip(chunk, computed):
+            result_cache.put(key, each)
+            yield q, each
+
+contract_index = load_contract_index()
+# stage timings of this script run; the ones of the last review, and of the upload that converted
+# and indexed the current contract, are kept in the session for the optional sidebar panel, since
+# every click reruns the script
+timings = Timings()
 uploaded_file = st.file_uploader("Choose a file (currently accepts pdf file format)", key=st.session_state.key)
 contract = ""
-retriever = None
+contract_hash = None
+index = None
 if uploaded_file is not None:
-    with open(os.path.join("contracts", uploaded_file.name), "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    all_docs = get_docs()
-    document_store.write_documents(all_docs)
+    contract_hash = hash_bytes(uploaded_file.getvalue())
+    if st.session_state.get('contract_id') not in (None, contract_hash):
+        contract_index.release(st.session_state.contract_id, st.session_state.session_id)
+        st.session_state.pop('ingest_timings', None)
+    st.session_state.contract_id = contract_hash
+    # only the uploaded file is converted, and only the first time its hash is seen
+    ingest_timings = Timings()
+    index = contract_index.add(contract_hash, uploaded_file.name, uploaded_file.getvalue(), ingest_timings,
+                               holder=st.session_state.session_id)["index"]
+    if ingest_timings.stages:
+        # this run wrote, converted or loaded the contract; later reruns find it in memory
+        st.session_state.ingest_timings = ingest_timings
     # with open(uploaded_file.name, "wb") as f:
     #     f.write(uploaded_file.getbuffer())
     #all_docs = convert_files_to_docs(dir_path="contracts", clean_func=clean_wiki_text, split_paragraphs=True)
@@ -173,7 +191,6 @@ if uploaded_file is not None:
     #docs = preprocessor.process(doc_txt)
     #document_store.write_documents(all_docs)
 
-retriever = get_retriever()
 try:
     with st.expander("Expand the contract document"):
         st.write(contract)
@@ -186,21 +203,7 @@ st.header("Contract Review (Beta)")
 
 
 def display_func(option):
-    entities = ["Document Name", "Parties", "Agreement Date", "Effective Date", "Expiration Date", "Renewal Term",
-                "Notice Period To Terminate Renewal", "Governing Law", "Most Favored Nation", "Non-Compete",
-                "Exclusivity", "No-Solicit Of Customers", "Competitive Restriction Exception",
-                "No-Solicit Of Employees", "Non-Disparagement", "Termination For Convenience", "Rofr/Rofo/Rofn",
-                "Change Of Control", "Anti-Assignment", "Revenue/Profit Sharing", "Price Restrictions",
-                "Minimum Commitment", "Volume Restriction", "Ip Ownership Assignment", "Joint Ip Ownership",
-                "License Grant", "Non-Transferable License", "Affiliate License-Licensor", "Affiliate License-Licensee",
-                "Unlimited/All-You-Can-Eat-License", "Irrevocable Or Perpetual License", "Source Code Escrow",
-                "Post-Termination Services", "Audit Rights", "Uncapped Liability", "Cap On Liability",
-                "Liquidated Damages", "Warranty Duration", "Insurance", "Covenant Not To Sue",
-                "Third Party Beneficiary"]
-    entities.sort()
-    for e in entities:
-        if e in option:
-            return e
+    return questions_module.REGISTRY.entity(option)
 
 
 # selected_question = st.selectbox('Choose one of the 41 queries from the CUAD dataset:', questions)
@@ -208,6 +211,7 @@ selected_questions = []
 selected_questions = st.multiselect('Select clause type(s) to search and review (can make multiple selections):',
                                     questions, format_func=display_func, key="multiselect")
 # question_set = [questions[0], selected_question]
+run_order = st.radio("Review order:", ["Selection order", "Fastest first"], horizontal=True)
 
 # for key, val in st.session_state.items():
 # 	st.write(key)
@@ -221,6 +225,9 @@ with col3:
     reset_button = st.button("Reset", on_click=clear_multi)
 if reset_button and 'key' in st.session_state.keys():
     st.session_state.pop('key')
+    if 'contract_id' in st.session_state:
+        contract_index.release(st.session_state.pop('contract_id'), st.session_state.session_id)
+    st.session_state.pop('ingest_timings', None)
     st.experimental_rerun()
 
 if 'boolean' not in st.session_state:
@@ -234,20 +241,22 @@ if Stop_button:
 # large-v2 indexed data
 # indexed_data = pd.read_pickle("index.pickle")
 
-if Run_Button and st.session_state.boolean == False and len(selected_questions) != 0:
-    pipe = ExtractiveQAPipeline(reader, retriever)
+if Run_Button and st.session_state.boolean == False and len(selected_questions) != 0 and contract_hash is not None:
     #	for question in selected_questions:
     question_set = selected_questions
+    if run_order == "Fastest first":
+        question_set = order_by_cost(question_set)
     with st.spinner('Running predictions...'):
         if st.session_state.boolean == False:
-            predictions = []
-            for each in question_set:
-                prediction = pipe.run(
-                    query=each, params={"Retriever": {"top_k": 1}, "Reader": {"top_k": 5}}
-                )
-                predictions.append(prediction)
-            for each in predictions:
-                st.write(each['answers'])
+            # each clause is rendered as soon as its batch is done. Cancellation relies on streamlit's
+            # rerun interrupt: pressing Stop stops this script at its next st call, i.e. after the
+            # current batch, and the chunks not started yet are never run.
+            st.session_state.last_timings = timings
+            predictions = stream_cached_review(question_set, contract_hash, index, timings=timings)
+            for question, each in predictions:
+                st.write(display_func(question))
+                st.write("Pages:", [answer_page(a) for a in each])
+                st.write(each)
         else:
             st.write("Stopping the function")
             predictions = ""
@@ -257,3 +266,19 @@ if st.session_state.boolean == True:
     st.write("Prediction Stopped")
     st.session_state.boolean = False
 
+result_cache = load_result_cache()
+with st.sidebar:
+    st.write("Cache hits:", result_cache.hits, "misses:", result_cache.misses)
+    if st.checkbox("Show timings"):
+        ingest_timings = st.session_state.get('ingest_timings')
+        last_timings = st.session_state.get('last_timings')
+        if ingest_timings is None and last_timings is None:
+            st.write("Upload a contract and run a review to see its timings")
+        else:
+            report = {
+                "ingest": ingest_timings.to_dict() if ingest_timings is not None else None,
+                "review": last_timings.to_dict() if last_timings is not None else None,
+            }
+            st.json(report)
+            st.download_button("Download timings", json.dumps(report, indent=2), file_name="timings.json",
+                               mime="application/json")
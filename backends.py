@@ -0,0 +1,192 @@
+"""
+CPU inference backends for the CoreCLM-CR reader.
+
+    fp32        the PyTorch checkpoint as shipped
+    int8        PyTorch dynamic int8 quantization of the Linear layers, applied at load time
+    onnx        ONNX export, run through onnxruntime
+    onnx-int8   ONNX export with onnxruntime dynamic int8 quantization
+
+ONNX artifacts are exported once and cached next to the checkpoint (e.g. CoreCLM-CR-onnx-int8/).
+The onnx backends need the onnxruntime and onnx packages.
+
+Accuracy parity against the fp32 reader can be checked on a fixed set of contracts with
+
+    python backends.py --backend onnx-int8 --contracts parity_contracts/
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import torch
+from haystack.nodes import FARMReader
+
+import question_encodings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("fp32", "int8", "onnx", "onnx-int8")
+
+
+def artifact_path(model_dir, backend):
+    if backend in ("fp32", "int8"):
+        return model_dir
+    return model_dir.rstrip("/\\") + "-" + backend
+
+
+ONNX_MODEL_FILE = "model.onnx"
+# operators onnxruntime's dynamic quantization puts in place of the fp32 MatMuls
+QUANTIZED_OPS = {"DynamicQuantizeLinear", "MatMulInteger", "DynamicQuantizeMatMul", "QLinearMatMul"}
+
+
+def prepare_model(model_dir="CoreCLM-CR", backend="fp32"):
+    # export the ONNX artifact the first time a backend is used; later calls reuse it
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown reader backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    path = artifact_path(model_dir, backend)
+    if not backend.startswith("onnx") or os.path.exists(os.path.join(path, ONNX_MODEL_FILE)):
+        return path
+    # export into a scratch folder of our own and move it into place when complete, so an interrupted
+    # export never leaves a half-written (or unquantized) artifact behind and processes exporting the
+    # same backend at once never touch each other's files
+    tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".tmp-")
+    try:
+        FARMReader.convert_to_onnx(model_name=model_dir, output_path=Path(tmp_path), task_type="question_answering")
+        if backend == "onnx-int8":
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            fp32_file = os.path.join(tmp_path, ONNX_MODEL_FILE)
+            int8_file = os.path.join(tmp_path, "model-int8.onnx")
+            quantize_dynamic(fp32_file, int8_file, weight_type=QuantType.QInt8)
+            # the reader always loads model.onnx
+            os.replace(int8_file, fp32_file)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process finished the same export first
+            if not os.path.exists(os.path.join(path, ONNX_MODEL_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def is_quantized_onnx(path):
+    import onnx
+
+    graph = onnx.load(os.path.join(path, ONNX_MODEL_FILE)).graph
+    return any(node.op_type in QUANTIZED_OPS for node in graph.node)
+
+
+def _pin_onnx_threads(model, path, num_threads):
+    # haystack's ONNXAdaptiveModel.load gives its onnxruntime session one thread per core, which
+    # oversubscribes the CPU as soon as more than one reader runs; rebuild it with num_threads
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.intra_op_num_threads = num_threads
+    options.inter_op_num_threads = 1
+    model.onnx_session = onnxruntime.InferenceSession(
+        os.path.join(path, ONNX_MODEL_FILE), options, providers=model.onnx_session.get_providers()
+    )
+
+
+def load_reader(model_dir="CoreCLM-CR", backend="fp32", batch_size=50, num_threads=None):
+    # num_threads pins the onnxruntime session of the onnx backends; torch threads are the caller's
+    # torch.set_num_threads
+    path = prepare_model(model_dir, backend)
+    reader = FARMReader(model_name_or_path=path, use_gpu=False, batch_size=batch_size)
+    if backend.startswith("onnx") and type(reader.inferencer.model).__name__ != "ONNXAdaptiveModel":
+        raise RuntimeError(f"Reader backend '{backend}' did not load the ONNX model in {path}")
+    if backend.startswith("onnx") and num_threads is not None:
+        _pin_onnx_threads(reader.inferencer.model, path, num_threads)
+    if backend == "onnx-int8" and not is_quantized_onnx(path):
+        raise RuntimeError(f"{path}/{ONNX_MODEL_FILE} is not an int8 graph; delete {path} to re-export it")
+    if backend == "int8":
+        reader.inferencer.model = torch.quantization.quantize_dynamic(
+            reader.inferencer.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    # tokenize every registered clause question once, up front, with this reader's tokenizer
+    if question_encodings.install(reader) is None:
+        logger.warning("Reader has no processor tokenizer, question encodings are not cached")
+    return reader
+
+
+def _top_answers(reader, questions, docs_per_question, top_k):
+    result = reader.predict_batch(queries=questions, documents=docs_per_question, top_k=top_k)
+    return result["answers"]
+
+
+def parity_check(candidate, reference, contract_paths, questions, top_k=5):
+    """
+    Compare the answers of a candidate reader with the fp32 reference reader.
+
+    Both readers see exactly the same retrieved passages for every (contract, question) pair. A pair
+    agrees when the top answers have the same span (text and document offsets). Returns a report dict
+    with the agreement rate and the disagreeing pairs.
+    """
+    from ingest import convert_file
+    from retrieval import BM25Index
+
+    pairs = 0
+    agreed = 0
+    mismatches = []
+    for path in contract_paths:
+        index = BM25Index(convert_file(path, meta={"name": os.path.basename(path)}))
+        docs_per_question = [index.retrieve_clause(q) for q in questions]
+        expected = _top_answers(reference, questions, docs_per_question, top_k)
+        actual = _top_answers(candidate, questions, docs_per_question, top_k)
+        for question, ref_answers, cand_answers in zip(questions, expected, actual):
+            pairs += 1
+            ref_span = _span(ref_answers)
+            cand_span = _span(cand_answers)
+            if ref_span == cand_span:
+                agreed += 1
+            else:
+                mismatches.append({"contract": path, "question": question, "fp32": ref_span, "candidate": cand_span})
+    return {
+        "pairs": pairs,
+        "agreement": agreed / pairs if pairs else 1.0,
+        "mismatches": mismatches,
+    }
+
+
+def _span(answers):
+    if not answers:
+        return None
+    answer = answers[0]
+    offsets = [[o.start, o.end] for o in answer.offsets_in_document or []]
+    return {"answer": answer.answer, "offsets": offsets}
+
+
+def main(argv=None):
+    from questions import load_questions
+
+    parser = argparse.ArgumentParser(description="Export a reader backend and check its accuracy against fp32.")
+    parser.add_argument("--model", default="CoreCLM-CR")
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS)
+    parser.add_argument("--contracts", help="directory of contracts to compare the backends on")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    args = parser.parse_args(argv)
+
+    candidate = load_reader(args.model, args.backend)
+    if args.contracts is None:
+        return 0
+    contract_paths = sorted(
+        os.path.join(args.contracts, name) for name in os.listdir(args.contracts)
+        if os.path.isfile(os.path.join(args.contracts, name))
+    )
+    reference = load_reader(args.model, "fp32")
+    report = parity_check(candidate, reference, contract_paths, load_questions())
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["agreement"] >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Headless batch review of a contract portfolio.
+
+Runs every CUAD clause question over each contract of a directory (or a manifest file listing one
+path per line) through a pool of worker processes, each holding its own reader with a pinned number
+of torch (or onnxruntime) threads. Results are appended to a JSONL file as contracts finish, so an interrupted run
+can be resumed by running the same command again; contracts already in the output are skipped.
+
+    python batch_review.py data_room/ --output reviews.jsonl --workers 4 --threads 2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from questions import REGISTRY
+
+CONTRACT_SUFFIXES = (".pdf", ".docx", ".txt")
+
+_worker = {}
+
+
+def list_contracts(source):
+    # absolute paths, so resuming does not depend on how the source was spelled on the command line
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(CONTRACT_SUFFIXES):
+                    paths.append(os.path.abspath(os.path.join(root, name)))
+        return sorted(paths)
+    # a manifest: one contract path per line, relative paths resolved against the manifest
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        return [os.path.abspath(os.path.join(base, line.strip())) for line in f
+                if line.strip() and not line.startswith("#")]
+
+
+def completed_contracts(output_path):
+    # contracts an earlier, possibly interrupted, run reviewed successfully; error records are retried
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a truncated last line from a killed run is simply recomputed
+                continue
+            if "answers" in record:
+                # outputs written before paths were absolute hold them relative to the working directory
+                done.add(os.path.abspath(record["contract"]))
+    return done
+
+
+def _init_worker(model_dir, backend, threads, batch_size, pdf_workers):
+    import torch
+
+    from backends import load_reader
+
+    torch.set_num_threads(threads)
+    _worker["reader"] = load_reader(model_dir, backend, batch_size=batch_size, num_threads=threads)
+    _worker["batch_size"] = batch_size
+    _worker["pdf_workers"] = pdf_workers
+
+
+def _review_contract(path):
+    from ingest import convert_file
+    from retrieval import BM25Index
+    from result_cache import hash_bytes
+    from review import answer_to_dict, run_review
+
+    with open(path, "rb") as f:
+        contract_id = hash_bytes(f.read())
+    record = {"contract": path, "contract_id": contract_id}
+    try:
+        docs = convert_file(path, meta={"name": os.path.basename(path), "contract_id": contract_id},
+                            workers=_worker["pdf_workers"])
+        question_set = REGISTRY.sorted_questions()
+        answers = run_review(_worker["reader"], BM25Index(docs), question_set, batch_size=_worker["batch_size"])
+        record["answers"] = {
+            REGISTRY.entity(q): [answer_to_dict(a) for a in each] for q, each in zip(question_set, answers)
+        }
+    except Exception as e:
+        record["error"] = repr(e)
+    return record
+
+
+def write_parquet(jsonl_path, parquet_path):
+    # one row per (contract, clause type, answer rank)
+    import pandas as pd
+
+    rows = []
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            for entity, answers in record.get("answers", {}).items():
+                for rank, answer in enumerate(answers):
+                    rows.append({
+                        "contract": record["contract"],
+                        "contract_id": record["contract_id"],
+                        "clause": entity,
+                        "rank": rank,
+                        "answer": answer["answer"],
+                        "score": answer["score"],
+                        "context": answer["context"],
+                        "page": answer.get("page"),
+                    })
+    pd.DataFrame(rows).to_parquet(parquet_path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review a directory or manifest of contracts without the UI.")
+    parser.add_argument("source", help="directory of contracts, or a manifest file with one path per line")
+    parser.add_argument("--output", default="reviews.jsonl")
+    parser.add_argument("--parquet", help="also write the results as a flat parquet table")
+    parser.add_argument("--model", default="CoreCLM-CR")
+    parser.add_argument("--backend", default=os.environ.get("READER_BACKEND", "fp32"))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=1, help="torch or onnxruntime threads per worker")
+    parser.add_argument("--pdf-workers", type=int, default=1,
+                        help="concurrent pdftotext processes per contract inside each worker")
+    parser.add_argument("--batch-size", type=int, default=int(os.environ.get("READER_BATCH_SIZE", 64)))
+    args = parser.parse_args(argv)
+
+    workers = args.workers or max(1, multiprocessing.cpu_count() // args.threads)
+    done = completed_contracts(args.output)
+    pending = [p for p in list_contracts(args.source) if p not in done]
+    print(f"{len(pending)} contracts to review ({len(done)} already done), {workers} workers x {args.threads} threads",
+          file=sys.stderr)
+
+    start = time.time()
+    reviewed = 0
+    if pending:
+        from backends import prepare_model
+
+        # export the ONNX artifact here, once, so the workers only load it
+        prepare_model(args.model, args.backend)
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(workers, len(pending)), initializer=_init_worker,
+                          initargs=(args.model, args.backend, args.threads, args.batch_size,
+                                    args.pdf_workers)) as pool, \
+                open(args.output, "a", encoding="utf-8") as out:
+            for record in pool.imap_unordered(_review_contract, pending):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                reviewed += 1
+                elapsed = time.time() - start
+                print(f"[{reviewed}/{len(pending)}] {record['contract']} "
+                      f"({reviewed / elapsed * 60:.1f} contracts/min)", file=sys.stderr)
+
+    elapsed = time.time() - start
+    if reviewed:
+        print(f"Reviewed {reviewed} contracts in {elapsed:.1f}s, {reviewed / elapsed * 60:.1f} contracts/min",
+              file=sys.stderr)
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Reproducible benchmark of the review pipeline.
+
+Generates synthetic contracts of increasing size and runs each one through the same ingestion,
+retrieval and reader stages as the app, with every CUAD question selected. By default the reader is
+a tiny randomly initialised BERT that is generated locally, so the benchmark runs offline in a few
+seconds. Its answers are meaningless; the point is to catch latency regressions in the pipeline
+around the model. Pass --model CoreCLM-CR to time the real checkpoint.
+
+Every contract is timed both as a .txt file and rendered to a plain PDF, so the page-parallel
+pdftotext extraction that uploads go through is measured as well (needs pdftotext on the PATH).
+
+    python benchmark.py --sizes 10 50 200 --repeats 5 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+
+from questions import QUESTIONS
+
+CLAUSES = [
+    "This Agreement shall be governed by and construed in accordance with the laws of the State of {place}.",
+    "The Licensee shall maintain general liability insurance of not less than {amount} dollars.",
+    "Neither party may assign this Agreement without the prior written consent of the other party.",
+    "The initial term of this Agreement shall expire on {date} and renew automatically for one year.",
+    "In no event shall either party's liability exceed the fees paid in the twelve months before the claim.",
+    "Licensor grants Licensee a non-exclusive, non-transferable license to use the Software.",
+    "Either party may terminate this Agreement for convenience upon {days} days prior written notice.",
+    "Licensor shall deposit the source code of the Software with an escrow agent.",
+    "Each party shall have the right to audit the books and records of the other party once per year.",
+    "During the term neither party shall solicit or hire any employee of the other party.",
+]
+FILLER = ("the parties agree that the services will be provided in a professional manner and that all "
+          "deliverables described in the statement of work shall be accepted in writing by the customer").split()
+PLACES = ["Delaware", "New York", "California", "Texas"]
+
+
+def synthetic_contract(n_passages, seed=0):
+    rng = random.Random(seed)
+    passages = ["MASTER SERVICES AGREEMENT between Acme Corp. and Globex Inc., dated January 1, 2020."]
+    while len(passages) < n_passages:
+        if rng.random() < 0.3:
+            passages.append(rng.choice(CLAUSES).format(
+                place=rng.choice(PLACES), amount=rng.randint(1, 9) * 1000000,
+                date=f"December {rng.randint(1, 28)}, 20{rng.randint(21, 30)}", days=rng.choice([30, 60, 90]),
+            ))
+        else:
+            passages.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(30, 80))).capitalize() + ".")
+    return "\n\n".join(passages)
+
+
+def write_pdf(text, path, lines_per_page=50, chars_per_line=90):
+    # a minimal PDF with the text set in Helvetica, one blank line between paragraphs
+    lines = []
+    for para in text.split("\n\n"):
+        lines.extend(textwrap.wrap(para, chars_per_line))
+        lines.append("")
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for first in range(0, len(lines), lines_per_page):
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in lines[first:first + lines_per_page]:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def build_tiny_model(path):
+    # a 2-layer BERT with a vocabulary taken from the synthetic contracts and the CUAD questions
+    from transformers import AutoModelForQuestionAnswering, BertConfig, BertTokenizerFast
+
+    from retrieval import tokenize
+
+    words = set(FILLER) | set(PLACES)
+    for text in CLAUSES + QUESTIONS:
+        words.update(tokenize(text))
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(words) + [str(i) for i in range(10)]
+    os.makedirs(path, exist_ok=True)
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_file=vocab_file).save_pretrained(path)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=512)
+    model = AutoModelForQuestionAnswering.from_config(config)
+    model.save_pretrained(path)
+    return path
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    k = (len(values) - 1) * q / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def run_once(reader, contract_path, work_dir, batch_size):
+    from ingest import ContractIndex
+    from instrumentation import Timings
+    from result_cache import hash_bytes
+    from review import run_review
+
+    timings = Timings()
+    with open(contract_path, "rb") as f:
+        data = f.read()
+    # a fresh index every run, so conversion and indexing are part of the measurement
+    contract_index = ContractIndex(os.path.join(work_dir, "contracts"),
+                                   index_dir=tempfile.mkdtemp(dir=work_dir))
+    start = time.perf_counter()
+    index = contract_index.add(hash_bytes(data), os.path.basename(contract_path), data, timings)["index"]
+    run_review(reader, index, QUESTIONS, batch_size=batch_size, timings=timings)
+    latency = time.perf_counter() - start
+    contract_index.evict(hash_bytes(data))
+    return latency, timings.to_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the contract review pipeline.")
+    parser.add_argument("--model", help="reader checkpoint; a tiny stand-in model is generated when omitted")
+    parser.add_argument("--backend", default="fp32")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 800], help="passages per contract")
+    parser.add_argument("--formats", nargs="+", choices=["txt", "pdf"], default=["txt", "pdf"],
+                        help="file formats every contract is timed in")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--output", help="write the report as JSON to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    import torch
+
+    from backends import load_reader
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    work_dir = tempfile.mkdtemp(prefix="contract-review-bench-")
+    model_dir = args.model or build_tiny_model(os.path.join(work_dir, "tiny-model"))
+    reader = load_reader(model_dir, args.backend, batch_size=args.batch_size, num_threads=args.threads)
+
+    report = {"model": args.model or "tiny", "backend": args.backend, "threads": args.threads,
+              "batch_size": args.batch_size, "sizes": []}
+    for size in args.sizes:
+        text = synthetic_contract(size, seed=size)
+        for file_format in args.formats:
+            contract_path = os.path.join(work_dir, f"contract_{size}.{file_format}")
+            if file_format == "pdf":
+                write_pdf(text, contract_path)
+            else:
+                with open(contract_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+            run_once(reader, contract_path, work_dir, args.batch_size)  # warm-up
+            latencies = []
+            runs = []
+            for _ in range(args.repeats):
+                latency, stages = run_once(reader, contract_path, work_dir, args.batch_size)
+                latencies.append(latency)
+                runs.append(stages)
+            passages = runs[-1]["counters"].get("passages", 0)
+            reader_seconds = statistics.mean(r["stages"].get("reader", 0.0) for r in runs)
+            report["sizes"].append({
+                "passages": size,
+                "format": file_format,
+                "latency_seconds": {
+                    "p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p99": percentile(latencies, 99),
+                    "mean": statistics.mean(latencies),
+                },
+                "contracts_per_minute": 60 / statistics.mean(latencies),
+                "reader_passages_per_second": passages / reader_seconds if reader_seconds else None,
+                "last_run": runs[-1],
+            })
+            print(f"{size} passages ({file_format}): p50 {percentile(latencies, 50):.3f}s, "
+                  f"p90 {percentile(latencies, 90):.3f}s", file=sys.stderr)
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
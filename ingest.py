@@ -0,0 +1,118 @@
+import os
+import threading
+
+from haystack.nodes import TextConverter, DocxToTextConverter
+from haystack.schema import Document
+
+from instrumentation import NULL_TIMINGS
+from pdf_extract import DEFAULT_WORKERS, extract_pdf
+from retrieval import INDEX_VERSION, BM25Index
+
+
+def convert_file(file_path, meta=None, split_paragraphs=True, preprocessor=None, workers=DEFAULT_WORKERS):
+    # single-file counterpart of haystack's convert_files_to_docs; PDFs are extracted page-parallel
+    # and every passage carries its page number
+    suffix = os.path.splitext(file_path)[1].lower()
+    if suffix == ".pdf":
+        return extract_pdf(file_path, meta=meta, preprocessor=preprocessor, workers=workers)
+    if suffix == ".docx":
+        converter = DocxToTextConverter(remove_numeric_tables=False)
+    else:
+        converter = TextConverter(remove_numeric_tables=False)
+    documents = converter.convert(file_path=file_path, meta=meta)
+    if not split_paragraphs:
+        return documents
+    docs = []
+    for document in documents:
+        for para in document.content.split("\n\n"):
+            if not para.strip():
+                continue
+            docs.append(Document(content=para, meta=dict(document.meta or {})))
+    return docs
+
+
+class ContractIndex:
+    """
+    Per-contract BM25 indexes.
+
+    Every uploaded contract gets its own BM25Index, keyed by the SHA-256 of its bytes, so a new upload
+    only converts and indexes that one file and retrieval never sees other users' contracts.
+    Re-uploading an already indexed file is a no-op, and indexes are persisted to index_dir so a
+    restarted app does not convert and refit a contract it has seen before. The index is shared by
+    every session, so add() records which holder (session) uses a contract and release() only removes
+    the upload and its persisted index once the last holder has let go of it. evict() removes them
+    unconditionally, including files a previous process left on disk.
+    """
+
+    def __init__(self, contracts_dir="contracts", preprocessor=None, index_dir="index_cache",
+                 extraction_workers=DEFAULT_WORKERS):
+        self.contracts_dir = contracts_dir
+        self.preprocessor = preprocessor
+        self.extraction_workers = extraction_workers
+        self.index_dir = index_dir
+        self.contracts = {}
+        self.holders = {}
+        self.lock = threading.Lock()
+        os.makedirs(contracts_dir, exist_ok=True)
+        os.makedirs(index_dir, exist_ok=True)
+
+    def contract_path(self, contract_id, name):
+        return os.path.join(self.contracts_dir, contract_id + os.path.splitext(name)[1].lower())
+
+    def add(self, contract_id, name, data, timings=NULL_TIMINGS, holder=None):
+        with self.lock:
+            if holder is not None:
+                self.holders.setdefault(contract_id, set()).add(holder)
+            if contract_id in self.contracts:
+                return self.contracts[contract_id]
+        file_path = self.contract_path(contract_id, name)
+        with timings.stage("file_write"):
+            if not os.path.exists(file_path):
+                with open(file_path, "wb") as f:
+                    f.write(data)
+        index_path = os.path.join(self.index_dir, f"{contract_id}.v{INDEX_VERSION}.bm25.pkl")
+        if os.path.exists(index_path):
+            with timings.stage("index_load"):
+                index = BM25Index.load(index_path)
+        else:
+            with timings.stage("conversion"):
+                docs = convert_file(file_path, meta={"name": name, "contract_id": contract_id},
+                                    preprocessor=self.preprocessor, workers=self.extraction_workers)
+            with timings.stage("indexing"):
+                index = BM25Index(docs)
+                index.save(index_path)
+            timings.count("documents", len(docs))
+        entry = {"file_path": file_path, "index_path": index_path, "index": index}
+        with self.lock:
+            return self.contracts.setdefault(contract_id, entry)
+
+    def get(self, contract_id):
+        return self.contracts.get(contract_id)
+
+    def release(self, contract_id, holder):
+        # returns True when this was the last holder and the contract's files were removed
+        with self.lock:
+            holders = self.holders.get(contract_id, set())
+            holders.discard(holder)
+            if holders:
+                return False
+            self.holders.pop(contract_id, None)
+            self._remove(contract_id)
+        return True
+
+    def evict(self, contract_id):
+        with self.lock:
+            self.holders.pop(contract_id, None)
+            self._remove(contract_id)
+
+    def _remove(self, contract_id):
+        # by name rather than from the in-memory entry, so uploads and indexes (of any INDEX_VERSION)
+        # left by an earlier process go too; the persisted index holds the full passage text
+        self.contracts.pop(contract_id, None)
+        for directory in (self.contracts_dir, self.index_dir):
+            for name in os.listdir(directory):
+                if name.split(".", 1)[0] == contract_id:
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,72 @@
+import json
+import resource
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def process_peak_rss_bytes():
+    # the process's lifetime maximum, not the peak of any single review
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Timings:
+    """
+    Per-stage wall time and counters for one review.
+
+    Stages are timed with `with timings.stage("reader"):` and accumulate when entered more than once.
+    Counters hold how much work a stage did (passages, tokens) and the number of passages handed to
+    each reader call is kept as a list. The reader splits those passages into windows and batches
+    the windows itself, so these are not its batch sizes.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.passages_per_reader_call = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def record_reader_call(self, passages):
+        self.passages_per_reader_call.append(passages)
+
+    def to_dict(self):
+        return {
+            "stages": dict(self.stages),
+            "total_seconds": sum(self.stages.values()),
+            "counters": dict(self.counters),
+            "passages_per_reader_call": list(self.passages_per_reader_call),
+            "process_peak_rss_bytes": process_peak_rss_bytes(),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+
+class NullTimings(Timings):
+    # stand-in when nobody asked for timings, so call sites never check for None
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, value=1):
+        pass
+
+    def record_reader_call(self, passages):
+        pass
+
+
+NULL_TIMINGS = NullTimings()
@@ -0,0 +1,72 @@
+"""
+Page-parallel PDF text extraction with page numbers.
+
+The page ranges of a PDF are extracted concurrently, each by its own pdftotext process (the same
+tool haystack's PDFToTextConverter uses), and the pages are fed to a PreProcessor in page order as
+soon as they arrive. Every passage keeps the page it came from in its meta, so an answer's page is a
+lookup on the passage it was found in.
+"""
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from PyPDF2 import PdfReader
+from haystack.nodes import PreProcessor
+from haystack.schema import Document
+
+PAGES_PER_TASK = 16
+# concurrent pdftotext processes per PDF; kept small so callers that already run one reader per core
+# (e.g. batch_review's worker pool) are not oversubscribed
+DEFAULT_WORKERS = 2
+
+
+def default_preprocessor():
+    # passage splitting keeps the paragraph granularity of convert_files_to_docs(split_paragraphs=True)
+    return PreProcessor(
+        clean_empty_lines=True,
+        clean_whitespace=True,
+        clean_header_footer=False,
+        split_by="passage",
+        split_length=1,
+        split_respect_sentence_boundary=False,
+    )
+
+
+def page_count(file_path):
+    return len(PdfReader(file_path).pages)
+
+
+def extract_page_range(file_path, first_page, last_page):
+    # pages are 1-based and inclusive; pdftotext ends every page with a form feed
+    result = subprocess.run(
+        ["pdftotext", "-f", str(first_page), "-l", str(last_page), "-enc", "UTF-8", file_path, "-"],
+        capture_output=True, check=True,
+    )
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    return pages[:last_page - first_page + 1]
+
+
+def iter_pages(file_path, workers=DEFAULT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    # yields (page_number, text) in page order while later ranges are still being extracted
+    n_pages = page_count(file_path)
+    ranges = [(first, min(first + pages_per_task - 1, n_pages)) for first in range(1, n_pages + 1, pages_per_task)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_page_range, file_path, first, last) for first, last in ranges]
+        for (first, _), future in zip(ranges, futures):
+            for i, text in enumerate(future.result()):
+                yield first + i, text
+
+
+def extract_pdf(file_path, meta=None, preprocessor=None, workers=DEFAULT_WORKERS):
+    preprocessor = preprocessor or default_preprocessor()
+    docs = []
+    for page_number, text in iter_pages(file_path, workers=workers):
+        if not text.strip():
+            continue
+        page_meta = dict(meta or {}, page=page_number)
+        docs.extend(preprocessor.process([Document(content=text, meta=page_meta)]))
+    return docs
+
+
+def answer_page(answer):
+    # passages never span pages, so the passage's page is the answer's page
+    return (answer.meta or {}).get("page")
@@ -0,0 +1,67 @@
+"""
+Cached tokenizer encodings of the clause questions.
+
+The reader's preprocessing (haystack's tokenize_batch_question_answering) calls the tokenizer on the
+question again for every passage it is paired with, so a full review re-tokenizes the same long CUAD
+prompts for every passage of every contract. install() swaps the reader processor's tokenizer for a
+CachedQuestionTokenizer, which tokenizes each registered question once per set of tokenizer options
+and hands back the cached encoding afterwards; passage texts still go straight to the tokenizer.
+"""
+from questions import REGISTRY
+
+# the options haystack tokenizes questions with, used to warm the cache
+QUESTION_TOKENIZER_KWARGS = {
+    "return_offsets_mapping": True,
+    "return_special_tokens_mask": True,
+    "add_special_tokens": False,
+}
+
+
+class CachedQuestionTokenizer:
+    """Wraps a tokenizer and serves encodings of registered clause questions from a dict."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, method, text, args, kwargs):
+        if args or not isinstance(text, str) or REGISTRY.entity(text) is None:
+            return getattr(self.tokenizer, method)(text, *args, **kwargs)
+        key = (method, text, tuple(sorted(kwargs.items())))
+        encoding = self.cache.get(key)
+        if encoding is None:
+            self.misses += 1
+            # haystack only reads the returned encoding, so the same object can be shared
+            encoding = self.cache[key] = getattr(self.tokenizer, method)(text, **kwargs)
+        else:
+            self.hits += 1
+        return encoding
+
+    def __call__(self, text=None, *args, **kwargs):
+        return self._cached("__call__", text, args, kwargs)
+
+    def encode_plus(self, text, *args, **kwargs):
+        return self._cached("encode_plus", text, args, kwargs)
+
+    def __getattr__(self, name):
+        # everything else (is_fast, save_pretrained, ...) is the wrapped tokenizer's; the guard keeps
+        # unpickling from recursing before self.tokenizer exists
+        if name in ("tokenizer", "cache", "hits", "misses"):
+            raise AttributeError(name)
+        return getattr(self.tokenizer, name)
+
+
+def install(reader):
+    # returns the CachedQuestionTokenizer now used by the reader, or None if the reader has no
+    # processor tokenizer to wrap
+    processor = getattr(getattr(reader, "inferencer", None), "processor", None)
+    tokenizer = getattr(processor, "tokenizer", None)
+    if tokenizer is None:
+        return None
+    if not isinstance(tokenizer, CachedQuestionTokenizer):
+        tokenizer = processor.tokenizer = CachedQuestionTokenizer(tokenizer)
+        for question in REGISTRY.sorted_questions():
+            tokenizer(question, **QUESTION_TOKENIZER_KWARGS)
+    return tokenizer
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_directory(path):
+    # hash of every file in a model checkpoint, so a changed checkpoint never serves stale answers
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent on-disk cache of reader answers for one clause question of one contract.
+
+    Entries are keyed by (contract hash, model hash, question, retrieval settings, reader top_k)
+    and evicted least-recently-used first once the cache grows beyond max_bytes. The size on disk is
+    tracked in memory, so the directory is only scanned when an eviction is actually due.
+    """
+
+    def __init__(self, cache_dir="review_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # bytes on disk as of the last scan plus everything put() wrote since; overwritten entries and
+        # other processes' evictions make it an overestimate, which only triggers an early scan
+        self.size = 0
+        self.evict()
+
+    @staticmethod
+    def make_key(contract_hash, model_hash, question, retrieval_key, reader_top_k):
+        raw = "\x1f".join([contract_hash, model_hash, question, str(retrieval_key), str(reader_top_k)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        # touch the entry so eviction sees it as recently used; another session may have evicted it
+        # since the load, which still leaves us a valid value
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        # write to a temp file first so a concurrent reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f)
+            self.size += f.tell()
+        os.replace(tmp_path, self._path(key))
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self.size = total
+
+    def get_many(self, keys):
+        # returns {key: value} for the keys already cached
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
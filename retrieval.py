@@ -0,0 +1,165 @@
+"""
+BM25 passage retrieval with clause-aware prefiltering.
+
+Each contract gets a BM25Index over its passages. Term statistics (postings, document lengths and
+idf) are computed once when the index is built, and the index can be pickled per contract so a
+rerun does not refit it. Passages are ranked against the clause type's query from the registry (its
+name and details), not the full CUAD prompt, whose shared template words would otherwise decide the
+ranking. Every clause type has its own retriever top_k. A clause type can also have a keyword
+prefilter: passages that do not match are dropped before ranking, so the reader only sees plausible
+passages. This trades recall for precision: when some passages match, the passage plain BM25 would
+have ranked first can still be pruned. If no passage matches, ranking falls back to the whole
+contract.
+"""
+import math
+import os
+import pickle
+import re
+import tempfile
+from collections import Counter, defaultdict
+
+from questions import REGISTRY
+
+TOKEN_RE = re.compile(r"\w+")
+DEFAULT_TOP_K = 2
+# part of the persisted index filename and of the result cache key; bump it whenever text extraction,
+# preprocessing or the index format change, so old passages and the answers found in them are not reused
+INDEX_VERSION = 2
+
+# clause types whose answer usually sits in a single passage near the top of the contract
+CLAUSE_TOP_K = {
+    "Document Name": 1,
+    "Parties": 1,
+    "Agreement Date": 1,
+    "Effective Date": 1,
+    "Governing Law": 1,
+    "Exclusivity": 3,
+    "License Grant": 3,
+    "Post-Termination Services": 3,
+    "Cap On Liability": 3,
+    "Uncapped Liability": 3,
+}
+
+# alternatives are word stems, so they only anchor at the start of a word ("exclusiv" must match
+# "exclusive" and "exclusivity")
+CLAUSE_PREFILTERS = {
+    "Agreement Date": r"\b(date|day of|as of)",
+    "Effective Date": r"\beffective",
+    "Expiration Date": r"\b(expir|terminat|term of|initial term)",
+    "Renewal Term": r"\b(renew|extend|extension)",
+    "Notice Period To Terminate Renewal": r"\b(renew|non-renew|notice)",
+    "Governing Law": r"\b(govern|laws? of|jurisdiction|construed)",
+    "Most Favored Nation": r"\b(most favou?red|no less favou?rable|better terms|lower price)",
+    "Non-Compete": r"\b(compet|restrict)",
+    "Exclusivity": r"\b(exclusiv|sole|only)",
+    "No-Solicit Of Customers": r"\b(solicit|customer)",
+    "No-Solicit Of Employees": r"\b(solicit|hire|employ)",
+    "Non-Disparagement": r"\b(disparag|derogatory|negative statement)",
+    "Termination For Convenience": r"\b(terminat|convenience|without cause|for any reason)",
+    "Rofr/Rofo/Rofn": r"\b(first refusal|first offer|first negotiation|right of first)",
+    "Change Of Control": r"\b(change (of|in) control|merger|acquisition|acquire|substantially all)",
+    "Anti-Assignment": r"\b(assign|transfer)",
+    "Revenue/Profit Sharing": r"\b(revenue|profit|royalt)",
+    "Price Restrictions": r"\b(price|pricing)",
+    "Minimum Commitment": r"\b(minimum|at least)",
+    "Volume Restriction": r"\b(volume|exceed|threshold|caps?\b)",
+    "Ip Ownership Assignment": r"\b(intellectual property|owner|assign|title)",
+    "Joint Ip Ownership": r"\b(joint|jointly|co-own|shared)",
+    "License Grant": r"\b(licen[cs]e|sublicen[cs]e)",
+    "Non-Transferable License": r"\b(non-?transferable|transfer|licen[cs]e)",
+    "Affiliate License-Licensor": r"\b(affiliate)",
+    "Affiliate License-Licensee": r"\b(affiliate)",
+    "Unlimited/All-You-Can-Eat-License": r"\b(unlimited|enterprise|all you can eat)",
+    "Irrevocable Or Perpetual License": r"\b(irrevocabl|perpetu)",
+    "Source Code Escrow": r"\b(escrow|source code)",
+    "Post-Termination Services": r"\b(terminat|expir|surviv|wind-?down|transition)",
+    "Audit Rights": r"\b(audit|inspect|books|records)",
+    "Uncapped Liability": r"\b(liabil|indemn|consequential)",
+    "Cap On Liability": r"\b(liabil|in no event|exceed|limitation)",
+    "Liquidated Damages": r"\b(liquidated|termination fee|damages)",
+    "Warranty Duration": r"\b(warrant)",
+    "Insurance": r"\b(insur)",
+    "Covenant Not To Sue": r"\b(not to sue|contest|challenge|claim)",
+    "Third Party Beneficiary": r"\b(third[- ]party beneficiar|beneficiar)",
+}
+CLAUSE_PREFILTER_RES = {entity: re.compile(pattern, re.IGNORECASE) for entity, pattern in CLAUSE_PREFILTERS.items()}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def clause_top_k(question):
+    entity = REGISTRY.entity(question)
+    return REGISTRY.top_k.get(entity) or CLAUSE_TOP_K.get(entity, DEFAULT_TOP_K)
+
+
+def clause_prefilter(question):
+    entity = REGISTRY.entity(question)
+    return REGISTRY.prefilters.get(entity) or CLAUSE_PREFILTER_RES.get(entity)
+
+
+def clause_retrieval_key(question):
+    # everything about retrieval that changes which passages a question's answers come from
+    prefilter = clause_prefilter(question)
+    pattern = prefilter.pattern if prefilter else ""
+    return f"bm25-v{INDEX_VERSION}:{clause_top_k(question)}:{pattern}:{REGISTRY.query(question)}"
+
+
+class BM25Index:
+    """Okapi BM25 over the passages of one contract, with precomputed postings and idf."""
+
+    def __init__(self, docs, k1=1.5, b=0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.doc_lens = []
+        for i, doc in enumerate(docs):
+            terms = Counter(tokenize(doc.content))
+            self.doc_lens.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings[term].append((i, tf))
+        self.postings = dict(self.postings)
+        n_docs = len(docs)
+        self.avg_doc_len = sum(self.doc_lens) / n_docs if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def scores(self, query):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[i] / self.avg_doc_len)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def retrieve(self, query, top_k=DEFAULT_TOP_K, prefilter=None):
+        scores = self.scores(query)
+        candidates = range(len(self.docs))
+        if prefilter is not None:
+            matching = [i for i in candidates if prefilter.search(self.docs[i].content)]
+            if matching:
+                candidates = matching
+        ranked = sorted(candidates, key=lambda i: (-scores.get(i, 0.0), i))
+        return [self.docs[i] for i in ranked[:top_k]]
+
+    def retrieve_clause(self, question, use_prefilter=True):
+        prefilter = clause_prefilter(question) if use_prefilter else None
+        return self.retrieve(REGISTRY.query(question), clause_top_k(question), prefilter)
+
+    def save(self, path):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -0,0 +1,57 @@
+from instrumentation import NULL_TIMINGS
+from pdf_extract import answer_page
+from retrieval import clause_top_k, tokenize
+
+READER_TOP_K = 5
+
+
+def run_review(reader, index, question_set, reader_top_k=READER_TOP_K, batch_size=None, use_prefilter=True,
+               timings=NULL_TIMINGS):
+    # one batched reader pass over all selected questions; each question gets the passages its clause
+    # type retrieves from the contract's BM25 index, questions left without passages skip the reader.
+    # Returns one answer list per question, in the order of question_set
+    with timings.stage("retrieval"):
+        docs_per_question = [index.retrieve_clause(q, use_prefilter=use_prefilter) for q in question_set]
+    answers = [[] for _ in question_set]
+    to_read = [i for i, docs in enumerate(docs_per_question) if docs]
+    if len(to_read) != 0:
+        passages = [doc for i in to_read for doc in docs_per_question[i]]
+        timings.count("questions", len(to_read))
+        timings.count("passages", len(passages))
+        timings.count("passage_tokens", sum(len(tokenize(doc.content)) for doc in passages))
+        timings.record_reader_call(len(passages))
+        with timings.stage("reader"):
+            result = reader.predict_batch(
+                queries=[question_set[i] for i in to_read],
+                documents=[docs_per_question[i] for i in to_read],
+                top_k=reader_top_k,
+                batch_size=batch_size,
+            )
+        for i, each in zip(to_read, result["answers"]):
+            # predict_batch does not copy document meta (e.g. the page) onto answers the way
+            # BaseReader.run does, so do it here
+            docs_by_id = {doc.id: doc for doc in docs_per_question[i]}
+            for answer in each:
+                if answer.document_ids and answer.document_ids[0] in docs_by_id:
+                    answer.meta = dict(docs_by_id[answer.document_ids[0]].meta, **(answer.meta or {}))
+            answers[i] = each
+    return answers
+
+
+def order_by_cost(question_set):
+    # the reader's cost per question grows with the question length, since it is repeated in every
+    # passage window, times the number of passages its clause type retrieves; running the cheap ones
+    # first gets the first answers on screen sooner
+    return sorted(question_set, key=lambda q: len(q) * clause_top_k(q))
+
+
+def answer_to_dict(answer):
+    # JSON friendly view of a haystack Answer
+    return {
+        "answer": answer.answer,
+        "score": answer.score,
+        "context": answer.context,
+        "document_ids": answer.document_ids,
+        "page": answer_page(answer),
+        "offsets_in_document": [[o.start, o.end] for o in answer.offsets_in_document or []],
+    }
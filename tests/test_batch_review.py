@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_review  # noqa: E402
+from batch_review import completed_contracts, list_contracts, main  # noqa: E402
+
+
+def write_records(path, records, tail=""):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.write(tail)
+
+
+def test_completed_contracts_skips_errors_and_truncated_lines(tmp_path):
+    output = tmp_path / "reviews.jsonl"
+    write_records(output, [
+        {"contract": str(tmp_path / "a.pdf"), "contract_id": "a", "answers": {}},
+        {"contract": str(tmp_path / "b.pdf"), "contract_id": "b", "error": "RuntimeError()"},
+    ], tail='{"contract": "' + str(tmp_path / "c.pdf") + '", "answ')
+    assert completed_contracts(str(output)) == {str(tmp_path / "a.pdf")}
+
+
+def test_completed_contracts_without_output(tmp_path):
+    assert completed_contracts(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_resume_does_not_depend_on_source_spelling(tmp_path, monkeypatch):
+    data_room = tmp_path / "data_room"
+    (data_room / "sub").mkdir(parents=True)
+    for name in ("a.pdf", "sub/b.txt", "notes.md"):
+        (data_room / name).write_text("contract")
+    monkeypatch.chdir(tmp_path)
+    # a record written by a run started as `batch_review.py data_room/` before paths were absolute
+    write_records(tmp_path / "reviews.jsonl", [{"contract": "data_room/a.pdf", "contract_id": "a", "answers": {}}])
+    contracts = list_contracts("data_room")
+    assert contracts == list_contracts("data_room/") == [str(data_room / "a.pdf"), str(data_room / "sub" / "b.txt")]
+    assert completed_contracts("reviews.jsonl") == {contracts[0]}
+
+
+def test_manifest_paths_resolve_against_the_manifest(tmp_path, monkeypatch):
+    (tmp_path / "manifests").mkdir()
+    manifest = tmp_path / "manifests" / "portfolio.txt"
+    manifest.write_text("# portfolio\n../contracts/a.pdf\n\n" + str(tmp_path / "b.pdf") + "\n")
+    monkeypatch.chdir("/")
+    assert list_contracts(str(manifest)) == [str(tmp_path / "contracts" / "a.pdf"), str(tmp_path / "b.pdf")]
+
+
+def test_nothing_pending_starts_no_workers(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("contract")
+    output = tmp_path / "reviews.jsonl"
+    write_records(output, [{"contract": str(tmp_path / "a.txt"), "contract_id": "a", "answers": {}}])
+
+    def no_pool(method):
+        raise AssertionError("a pool was started with nothing to review")
+
+    monkeypatch.setattr(batch_review.multiprocessing, "get_context", no_pool)
+    assert main([str(tmp_path), "--output", str(output)]) == 0
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("haystack")
+
+from ingest import ContractIndex  # noqa: E402
+
+CONTRACT = b"This Agreement is governed by the laws of Delaware.\n\nSupplier shall maintain insurance."
+
+
+def make_index(tmp_path):
+    return ContractIndex(str(tmp_path / "contracts"), index_dir=str(tmp_path / "index_cache"))
+
+
+def files(tmp_path):
+    return sorted(os.listdir(tmp_path / "contracts")) + sorted(os.listdir(tmp_path / "index_cache"))
+
+
+def test_files_stay_until_the_last_holder_releases(tmp_path):
+    index = make_index(tmp_path)
+    index.add("abc", "contract.txt", CONTRACT, holder="session-1")
+    index.add("abc", "contract.txt", CONTRACT, holder="session-2")
+    assert not index.release("abc", "session-1")
+    assert len(files(tmp_path)) == 2
+    assert index.release("abc", "session-2")
+    assert files(tmp_path) == []
+    assert index.get("abc") is None
+
+
+def test_evict_removes_files_of_an_earlier_process(tmp_path):
+    make_index(tmp_path).add("abc", "contract.txt", CONTRACT)
+    # a restarted app has nothing in memory for the contract
+    index = make_index(tmp_path)
+    (tmp_path / "index_cache" / "abc.v1.bm25.pkl").write_bytes(b"stale")
+    (tmp_path / "contracts" / "abcd.txt").write_bytes(b"another contract")
+    index.evict("abc")
+    assert files(tmp_path) == ["abcd.txt"]
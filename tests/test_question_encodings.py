@@ -0,0 +1,86 @@
+import os
+import pickle
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import question_encodings  # noqa: E402
+from questions import REGISTRY  # noqa: E402
+
+
+class CountingTokenizer:
+    is_fast = True
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text=None, **kwargs):
+        self.calls.append(text)
+        return {"input_ids": [len(t.split()) for t in text] if isinstance(text, list) else len(text.split())}
+
+
+def fake_reader():
+    return SimpleNamespace(inferencer=SimpleNamespace(processor=SimpleNamespace(tokenizer=CountingTokenizer())))
+
+
+def test_install_wraps_processor_tokenizer_and_warms_cache():
+    reader = fake_reader()
+    inner = reader.inferencer.processor.tokenizer
+    tokenizer = question_encodings.install(reader)
+    assert reader.inferencer.processor.tokenizer is tokenizer
+    assert len(inner.calls) == len(REGISTRY)
+    assert tokenizer.is_fast
+    # installing twice does not wrap the wrapper
+    assert question_encodings.install(reader) is tokenizer
+
+
+def test_questions_are_tokenized_once_across_passages():
+    reader = fake_reader()
+    inner = reader.inferencer.processor.tokenizer
+    tokenizer = question_encodings.install(reader)
+    question = REGISTRY.question("Insurance")
+    warm_calls = len(inner.calls)
+    # what tokenize_batch_question_answering does for one question paired with three passages
+    for passage in ["first passage", "second passage", "third passage"]:
+        tokenizer(text=[passage], **question_encodings.QUESTION_TOKENIZER_KWARGS)
+        tokenizer(question, **question_encodings.QUESTION_TOKENIZER_KWARGS)
+    assert inner.calls[warm_calls:] == [["first passage"], ["second passage"], ["third passage"]]
+    assert tokenizer.hits == 3
+
+
+def test_other_texts_and_options_are_not_served_from_cache():
+    reader = fake_reader()
+    tokenizer = question_encodings.install(reader)
+    question = REGISTRY.question("Parties")
+    tokenizer("not a clause question", **question_encodings.QUESTION_TOKENIZER_KWARGS)
+    tokenizer(question, add_special_tokens=True)
+    assert tokenizer.hits == 0
+
+
+def test_install_without_tokenizer_returns_none():
+    assert question_encodings.install(SimpleNamespace()) is None
+
+
+def test_wrapper_pickles():
+    tokenizer = question_encodings.CachedQuestionTokenizer(CountingTokenizer())
+    assert pickle.loads(pickle.dumps(tokenizer)).is_fast
+
+
+def test_cache_is_hit_during_predict_batch(tmp_path):
+    pytest.importorskip("haystack")
+    pytest.importorskip("transformers")
+    from haystack.schema import Document
+
+    from backends import load_reader
+    from benchmark import build_tiny_model
+
+    reader = load_reader(build_tiny_model(str(tmp_path / "tiny-model")), "fp32", batch_size=4)
+    tokenizer = reader.inferencer.processor.tokenizer
+    assert isinstance(tokenizer, question_encodings.CachedQuestionTokenizer)
+    hits = tokenizer.hits
+    docs = [Document(content="The Licensee shall maintain insurance."), Document(content="Payment is due in 30 days.")]
+    reader.predict_batch(queries=[REGISTRY.question("Insurance")], documents=[docs], top_k=1)
+    assert tokenizer.hits >= hits + len(docs)
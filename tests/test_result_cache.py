@@ -0,0 +1,65 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import result_cache  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+
+
+def age(cache, key, mtime):
+    os.utime(cache._path(key), (mtime, mtime))
+
+
+def entry_size(cache, key):
+    return os.path.getsize(cache._path(key))
+
+
+def test_get_counts_hits_and_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", ["answer"])
+    assert cache.get("a") == ["answer"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_get_many_returns_only_cached_keys(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_evicts_least_recently_used_after_get_touch(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for mtime, key in enumerate(["a", "b", "c"], 1):
+        cache.put(key, key * 100)
+        age(cache, key, mtime * 1000)
+    # reading "a" makes "b" the least recently used entry
+    cache.get("a")
+    cache.max_bytes = entry_size(cache, "a") * 2
+    cache.evict()
+    assert cache.get_many(["a", "b", "c"]).keys() == {"a", "c"}
+
+
+def test_put_scans_only_when_over_the_limit(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    cache.put("a", "a" * 100)
+    cache.max_bytes = entry_size(cache, "a") * 2
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(result_cache.os, "listdir", lambda path: scans.append(path) or listdir(path))
+    cache.put("b", "b" * 100)
+    assert scans == []
+    age(cache, "a", 1000)
+    cache.put("c", "c" * 100)
+    assert len(scans) == 1
+    assert not os.path.exists(cache._path("a"))
+    assert cache.size == entry_size(cache, "b") + entry_size(cache, "c")
+
+
+def test_size_includes_existing_entries(tmp_path):
+    ResultCache(str(tmp_path)).put("a", "a" * 100)
+    cache = ResultCache(str(tmp_path))
+    assert cache.size == entry_size(cache, "a")
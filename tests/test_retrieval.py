@@ -0,0 +1,121 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from questions import REGISTRY  # noqa: E402
+from retrieval import CLAUSE_PREFILTER_RES, CLAUSE_PREFILTERS, BM25Index, clause_retrieval_key  # noqa: E402
+
+# one sentence per clause type that its prefilter must keep
+POSITIVE_SENTENCES = {
+    "Agreement Date": "This Agreement is dated as of March 3, 2019.",
+    "Effective Date": "This Agreement becomes effective upon signature.",
+    "Expiration Date": "This Agreement expires on December 31, 2025.",
+    "Renewal Term": "The term renews automatically for successive one-year periods.",
+    "Notice Period To Terminate Renewal": "Either party may give notice of non-renewal 60 days in advance.",
+    "Governing Law": "This Agreement is governed by the laws of Delaware.",
+    "Most Favored Nation": "Supplier shall offer terms no less favorable than those given to any other customer.",
+    "Non-Compete": "Distributor shall not compete with Company in the Territory.",
+    "Exclusivity": "Company appoints Distributor as its exclusive distributor in the Territory.",
+    "No-Solicit Of Customers": "Neither party shall solicit the customers of the other party.",
+    "No-Solicit Of Employees": "Neither party shall hire employees of the other party.",
+    "Non-Disparagement": "Neither party shall disparage the other party.",
+    "Termination For Convenience": "Either party may terminate this Agreement for convenience.",
+    "Rofr/Rofo/Rofn": "Company grants Partner a right of first refusal on any sale of the Product.",
+    "Change Of Control": "A change of control of either party requires the consent of the other.",
+    "Anti-Assignment": "This Agreement may not be assigned without prior written consent.",
+    "Revenue/Profit Sharing": "Licensee shall pay Licensor royalties of five percent of net sales.",
+    "Price Restrictions": "Supplier shall not increase prices during the first year.",
+    "Minimum Commitment": "Customer shall purchase minimums of 1,000 units per quarter.",
+    "Volume Restriction": "Additional fees apply if usage exceeds 10,000 calls per month.",
+    "Ip Ownership Assignment": "All intellectual property developed hereunder is owned by Company.",
+    "Joint Ip Ownership": "The parties shall jointly own all improvements.",
+    "License Grant": "Licensor grants Licensee a license to use the Software.",
+    "Non-Transferable License": "The license granted herein is non-transferable.",
+    "Affiliate License-Licensor": "Licensor and its Affiliates grant Licensee a license to the Patents.",
+    "Affiliate License-Licensee": "The license extends to Licensee's Affiliates.",
+    "Unlimited/All-You-Can-Eat-License": "Customer receives an enterprise license for unlimited users.",
+    "Irrevocable Or Perpetual License": "The license is perpetual and irrevocable.",
+    "Source Code Escrow": "Licensor shall deposit the source code with an escrow agent.",
+    "Post-Termination Services": "Sections 5 and 9 survive termination of this Agreement.",
+    "Audit Rights": "Company may audit Distributor's books once per year.",
+    "Uncapped Liability": "Liability for indemnification obligations is not limited.",
+    "Cap On Liability": "In no event shall either party's liability exceed the fees paid.",
+    "Liquidated Damages": "Customer shall pay liquidated damages equal to three months of fees.",
+    "Warranty Duration": "Supplier warrants the Products for twelve months after delivery.",
+    "Insurance": "Contractor shall maintain commercial general liability insurance.",
+    "Covenant Not To Sue": "Licensee shall not contest the validity of the Licensed Patents.",
+    "Third Party Beneficiary": "There are no third party beneficiaries to this Agreement.",
+}
+
+
+def doc(content):
+    return SimpleNamespace(content=content, meta={})
+
+
+@pytest.mark.parametrize("entity", sorted(CLAUSE_PREFILTERS))
+def test_prefilter_keeps_positive_sentence(entity):
+    assert CLAUSE_PREFILTER_RES[entity].search(POSITIVE_SENTENCES[entity])
+
+
+def test_every_prefilter_has_a_positive_sentence():
+    assert set(POSITIVE_SENTENCES) == set(CLAUSE_PREFILTERS)
+
+
+def test_exclusivity_keeps_exclusive_passage():
+    index = BM25Index([
+        doc("Payment is due only upon invoice."),
+        doc("Company appoints Distributor as its exclusive distributor in the Territory."),
+        doc("This Agreement is governed by the laws of Delaware."),
+        doc("Supplier shall maintain insurance."),
+    ])
+    retrieved = index.retrieve_clause(REGISTRY.question("Exclusivity"))
+    assert "exclusive distributor" in " ".join(d.content for d in retrieved)
+
+
+def test_clause_query_drops_prompt_template():
+    query = REGISTRY.query(REGISTRY.question("Document Name"))
+    assert query == "Document Name The name of the contract"
+    assert REGISTRY.query("a question nobody registered") == "a question nobody registered"
+
+
+def test_document_name_is_not_ranked_by_template_words():
+    index = BM25Index([
+        doc("This contract is between the parties of this contract and shall be reviewed by a lawyer."),
+        doc("The name of this document is Master Services Agreement."),
+        doc("Payment is due upon invoice."),
+    ])
+    retrieved = index.retrieve_clause(REGISTRY.question("Document Name"))
+    assert retrieved[0].content.startswith("The name of this document")
+
+
+def test_prefilter_falls_back_to_whole_contract():
+    index = BM25Index([doc("Payment is due upon invoice."), doc("The Services are described in Exhibit A.")])
+    assert len(index.retrieve_clause(REGISTRY.question("Source Code Escrow"))) == 2
+
+
+def test_bm25_ranks_matching_passage_first():
+    index = BM25Index([
+        doc("Payment is due upon invoice."),
+        doc("This Agreement is governed by the laws of the State of New York."),
+    ])
+    assert index.retrieve("which state law governs the agreement", top_k=1)[0].content.startswith("This Agreement")
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index([doc("Licensor grants a license."), doc("Supplier shall maintain insurance.")])
+    path = str(tmp_path / "index.pkl")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.idf == index.idf
+    assert [d.content for d in loaded.docs] == [d.content for d in index.docs]
+
+
+def test_retrieval_key_changes_with_prefilter():
+    question = REGISTRY.question("Exclusivity")
+    key = clause_retrieval_key(question)
+    assert CLAUSE_PREFILTERS["Exclusivity"] in key
+    assert key != clause_retrieval_key(REGISTRY.question("Insurance"))